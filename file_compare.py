@@ -1,75 +1,505 @@
 import tkinter as tk
+import tkinter.font as tkfont
+import bisect
 import difflib
 import os
+import re
+from file_encoding import FileEncodingDetector
 
 class FileCompareWidget:
+    # Rows rendered above and below the visible viewport in side-by-side mode
+    VIEWPORT_MARGIN = 50
+    # Rows of context kept above a change when jumping to it
+    JUMP_CONTEXT = 3
+    # Longer line pairs are compared word by word instead of character by character
+    INTRALINE_CHAR_LIMIT = 500
+    # Line pairs less similar than this are left as whole-line changes
+    INTRALINE_MIN_RATIO = 0.3
+    # Tokens used for word level comparison
+    WORD_PATTERN = re.compile(r'\w+|\s+|[^\w\s]')
+    # Markers for line endings, shown on changed lines when the two files end lines differently
+    EOL_NAMES = {'\r\n': 'CRLF', '\r': 'CR', '\n': 'LF', '': 'no newline'}
+
     def __init__(self, parent):
         self.parent = parent
-        
+
+        # Diff state shared by both views
+        self.old_lines = []
+        self.new_lines = []
+        self.matcher = None
+        self.opcodes = []
+        self.row_starts = []  # First side-by-side row of each opcode
+        self.change_rows = []  # First side-by-side row of each non-equal opcode
+        self.total_rows = 0
+        self.header = ''
+        self.message = None
+        self.show_eol = False
+        self.unified_dirty = True
+
+        # Intra-line highlights, computed on demand for visible replaced line pairs only
+        self.intraline_cache = {}  # (old index, new index) -> (old spans, new spans)
+        self.unified_pairs = []  # (old text line, new text line, old index, new index)
+        self.unified_pair_new_lines = []
+        self.unified_highlighted = set()
+        self.split_pairs = {}  # side-by-side row -> (old index, new index) of rendered replaced rows
+        self.split_highlighted = set()
+
+        # Side-by-side viewport state
+        self.top_row = 0
+        self.rendered_range = (0, 0)
+        self.side_by_side = tk.BooleanVar(value=False)
+
+        # Toolbar: view mode and change navigation
+        toolbar = tk.Frame(parent)
+        toolbar.grid(row=0, column=0, sticky='ew')
+        tk.Checkbutton(toolbar, text="Side by side", variable=self.side_by_side,
+                       command=self.refresh_view).pack(side=tk.LEFT, padx=5)
+        tk.Button(toolbar, text="Prev change", command=self.prev_change).pack(side=tk.LEFT, padx=5)
+        tk.Button(toolbar, text="Next change", command=self.next_change).pack(side=tk.LEFT, padx=5)
+
+        # Unified view
+        self.unified_frame = tk.Frame(parent)
+
         # Create text area and scrollbars
-        self.text_widget = tk.Text(parent, wrap=tk.NONE)
-        scrolly = tk.Scrollbar(parent, command=self.text_widget.yview)
-        scrollx = tk.Scrollbar(parent, orient=tk.HORIZONTAL, command=self.text_widget.xview)
-        
-        # Configure scrolling
-        self.text_widget.config(yscrollcommand=scrolly.set, xscrollcommand=scrollx.set)
-        
+        self.text_widget = tk.Text(self.unified_frame, wrap=tk.NONE)
+        scrolly = tk.Scrollbar(self.unified_frame, command=self.text_widget.yview)
+        scrollx = tk.Scrollbar(self.unified_frame, orient=tk.HORIZONTAL, command=self.text_widget.xview)
+
+        # Configure scrolling, highlight changed characters whenever the view moves
+        def on_unified_yscroll(first, last):
+            scrolly.set(first, last)
+            self.highlight_unified_visible()
+
+        self.text_widget.config(yscrollcommand=on_unified_yscroll, xscrollcommand=scrollx.set)
+
         # Set tag styles
-        self.text_widget.tag_configure('add', background='#e6ffe6')
-        self.text_widget.tag_configure('delete', background='#ffe6e6')
-        self.text_widget.tag_configure('header', background='#f0f0f0')
-        
+        self.configure_tags(self.text_widget)
+
         # Place components
         self.text_widget.grid(row=0, column=0, sticky='nsew')
         scrolly.grid(row=0, column=1, sticky='ns')
         scrollx.grid(row=1, column=0, sticky='ew')
-        
+        self.unified_frame.grid_rowconfigure(0, weight=1)
+        self.unified_frame.grid_columnconfigure(0, weight=1)
+
+        # Side-by-side view, the panes only hold the rows around the viewport
+        self.split_frame = tk.Frame(parent)
+        self.old_text = tk.Text(self.split_frame, wrap=tk.NONE, width=40)
+        self.new_text = tk.Text(self.split_frame, wrap=tk.NONE, width=40)
+        self.split_scrolly = tk.Scrollbar(self.split_frame, command=self.on_split_yscroll)
+        split_scrollx = tk.Scrollbar(self.split_frame, orient=tk.HORIZONTAL, command=self.on_split_xscroll)
+        self.old_text.config(xscrollcommand=split_scrollx.set)
+
+        for widget in (self.old_text, self.new_text):
+            self.configure_tags(widget)
+            widget.bind('<MouseWheel>', self.on_split_mousewheel)
+            widget.bind('<Button-4>', self.on_split_mousewheel)
+            widget.bind('<Button-5>', self.on_split_mousewheel)
+            widget.bind('<Configure>', lambda e: self.render_split())
+            widget.config(state='disabled')
+
+        self.old_text.grid(row=0, column=0, sticky='nsew')
+        self.new_text.grid(row=0, column=1, sticky='nsew')
+        self.split_scrolly.grid(row=0, column=2, sticky='ns')
+        split_scrollx.grid(row=1, column=0, columnspan=2, sticky='ew')
+        self.split_frame.grid_rowconfigure(0, weight=1)
+        self.split_frame.grid_columnconfigure(0, weight=1)
+        self.split_frame.grid_columnconfigure(1, weight=1)
+
+        self.line_height = max(tkfont.Font(font=self.old_text.cget('font')).metrics('linespace'), 1)
+
         # Set grid weights
-        parent.grid_rowconfigure(0, weight=1)
+        parent.grid_rowconfigure(1, weight=1)
         parent.grid_columnconfigure(0, weight=1)
-        
+        self.unified_frame.grid(row=1, column=0, sticky='nsew')
+
         # Set to readonly
         self.text_widget.config(state='disabled')
 
+    @staticmethod
+    def configure_tags(widget):
+        """Set diff tag styles on a text widget"""
+        widget.tag_configure('add', background='#e6ffe6')
+        widget.tag_configure('delete', background='#ffe6e6')
+        widget.tag_configure('header', background='#f0f0f0')
+        widget.tag_configure('filler', background='#f4f4f4')
+        widget.tag_configure('lineno', foreground='#888888')
+        # Created last so they take priority over the whole-line backgrounds
+        widget.tag_configure('add_char', background='#9be89b')
+        widget.tag_configure('delete_char', background='#ffb0b0')
+
     def show_diff(self, old_path, new_path):
         """Show the difference between two files"""
-        self.text_widget.config(state='normal')
-        self.text_widget.delete('1.0', tk.END)
-        
+        self.old_lines = []
+        self.new_lines = []
+        self.matcher = None
+        self.opcodes = []
+        self.header = ''
+        self.message = None
+        self.show_eol = False
+        self.intraline_cache = {}
+
         try:
             # Read file contents
             old_content = ''
             new_content = ''
-            
+
+            old_encoding = new_encoding = None
             if os.path.exists(old_path):
-                with open(old_path, 'r', encoding='utf-8') as f:
-                    old_content = f.read()
-            
+                old_content, old_encoding = FileEncodingDetector.read_text(old_path)
+
             if os.path.exists(new_path):
-                with open(new_path, 'r', encoding='utf-8') as f:
-                    new_content = f.read()
-            
-            # Use difflib to compare differences
-            diff = difflib.unified_diff(
-                old_content.splitlines(keepends=True),
-                new_content.splitlines(keepends=True),
-                fromfile='Old file',
-                tofile='New file',
-                lineterm=''
-            )
-            
-            # Display differences
-            for line in diff:
-                if line.startswith('---') or line.startswith('+++'):
-                    self.text_widget.insert(tk.END, line + '\n', 'header')
-                elif line.startswith('+'):
-                    self.text_widget.insert(tk.END, line + '\n', 'add')
-                elif line.startswith('-'):
-                    self.text_widget.insert(tk.END, line + '\n', 'delete')
-                else:
-                    self.text_widget.insert(tk.END, line + '\n')
-                
+                new_content, new_encoding = FileEncodingDetector.read_text(new_path)
+
+            if old_content is None or new_content is None:
+                self.message = "Binary or undecodable file, diff not shown."
+            else:
+                if old_encoding or new_encoding:
+                    self.header = f"Encoding: {old_encoding or '-'} -> {new_encoding or '-'}\n"
+
+                # Compute the diff opcodes once, both views are rendered from them.
+                # Line endings are kept so CRLF/LF and final newline changes are not lost.
+                self.old_lines = old_content.splitlines(keepends=True)
+                self.new_lines = new_content.splitlines(keepends=True)
+                old_eols = {self.split_eol(line)[1] for line in self.old_lines}
+                new_eols = {self.split_eol(line)[1] for line in self.new_lines}
+                self.show_eol = old_eols != new_eols
+                self.matcher = difflib.SequenceMatcher(None, self.old_lines, self.new_lines)
+                self.opcodes = self.matcher.get_opcodes()
+
         except Exception as e:
-            self.text_widget.insert(tk.END, f"Can't compare files: {str(e)}")
-        
+            self.message = f"Can't compare files: {str(e)}"
+
+        self.build_row_index()
+        self.top_row = 0
+        self.rendered_range = (0, 0)
+        self.unified_dirty = True
+        self.refresh_view()
+
+    def build_row_index(self):
+        """Map side-by-side rows to opcodes (one row per line of the longer side)"""
+        self.row_starts = []
+        self.change_rows = []
+        row = 0
+        for tag, i1, i2, j1, j2 in self.opcodes:
+            self.row_starts.append(row)
+            if tag != 'equal':
+                self.change_rows.append(row)
+            row += max(i2 - i1, j2 - j1)
+        self.total_rows = row
+
+    def refresh_view(self):
+        """Show the view selected by the side-by-side option"""
+        if self.side_by_side.get():
+            self.unified_frame.grid_remove()
+            self.split_frame.grid(row=1, column=0, sticky='nsew')
+            self.render_split()
+        else:
+            self.split_frame.grid_remove()
+            self.unified_frame.grid(row=1, column=0, sticky='nsew')
+            if self.unified_dirty:
+                self.render_unified()
+
+    @staticmethod
+    def split_eol(line):
+        """Split a line read with its ending into (text, line ending)"""
+        text = line.splitlines()[0] if line else ''
+        return text, line[len(text):]
+
+    def display_line(self, line, changed):
+        """Line text without its ending, with an ending marker on changed lines when endings differ"""
+        text, eol = self.split_eol(line)
+        if changed and self.show_eol:
+            text += f"  [{self.EOL_NAMES.get(eol, repr(eol))}]"
+        return text
+
+    # ======== Intra-line highlighting ========
+
+    def tokenize(self, line):
+        """Split a line into comparable tokens, characters for short lines and words for long ones"""
+        if len(line) <= self.INTRALINE_CHAR_LIMIT:
+            return list(line)
+        return self.WORD_PATTERN.findall(line)
+
+    def intraline_spans(self, old_index, new_index):
+        """Return the changed (start, end) character spans of a replaced line pair, memoized"""
+        key = (old_index, new_index)
+        if key in self.intraline_cache:
+            return self.intraline_cache[key]
+
+        old_tokens = self.tokenize(self.split_eol(self.old_lines[old_index])[0])
+        new_tokens = self.tokenize(self.split_eol(self.new_lines[new_index])[0])
+        matcher = difflib.SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+
+        old_spans = []
+        new_spans = []
+        if matcher.ratio() >= self.INTRALINE_MIN_RATIO:
+            # Token offsets -> character offsets
+            old_offsets = [0]
+            for token in old_tokens:
+                old_offsets.append(old_offsets[-1] + len(token))
+            new_offsets = [0]
+            for token in new_tokens:
+                new_offsets.append(new_offsets[-1] + len(token))
+
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                if tag == 'equal':
+                    continue
+                if i2 > i1:
+                    old_spans.append((old_offsets[i1], old_offsets[i2]))
+                if j2 > j1:
+                    new_spans.append((new_offsets[j1], new_offsets[j2]))
+
+        self.intraline_cache[key] = (old_spans, new_spans)
+        return old_spans, new_spans
+
+    @staticmethod
+    def tag_spans(widget, line, column, spans, tag):
+        """Apply a tag to character spans of one text line, offset by a prefix column"""
+        for start, end in spans:
+            widget.tag_add(tag, f"{line}.{column + start}", f"{line}.{column + end}")
+
+    # ======== Unified view ========
+
+    @staticmethod
+    def format_range(start, stop):
+        """Format a line range the way unified diff hunk headers do"""
+        beginning = start + 1
+        length = stop - start
+        if length == 1:
+            return f"{beginning}"
+        if not length:
+            beginning -= 1
+        return f"{beginning},{length}"
+
+    def render_unified(self):
+        """Render the unified diff from the cached opcodes"""
+        self.text_widget.config(state='normal')
+        self.text_widget.delete('1.0', tk.END)
+
+        self.unified_pairs = []
+        self.unified_pair_new_lines = []
+        self.unified_highlighted = set()
+
+        if self.message:
+            self.text_widget.insert(tk.END, self.message)
+        elif self.matcher is not None:
+            chunks = []
+            if self.header:
+                chunks += [self.header, 'header']
+            for index, group in enumerate(self.matcher.get_grouped_opcodes(3)):
+                if index == 0:
+                    chunks += ['--- Old file\n', 'header', '+++ New file\n', 'header']
+                first, last = group[0], group[-1]
+                old_range = self.format_range(first[1], last[2])
+                new_range = self.format_range(first[3], last[4])
+                chunks += [f"@@ -{old_range} +{new_range} @@\n", 'hunk']
+                for tag, i1, i2, j1, j2 in group:
+                    if tag == 'equal':
+                        for line in self.old_lines[i1:i2]:
+                            chunks += [' ' + self.display_line(line, False) + '\n', '']
+                        continue
+                    if tag == 'replace':
+                        # Remember where each replaced pair lands, text lines are 1-based
+                        old_line = len(chunks) // 2 + 1
+                        new_line = old_line + (i2 - i1)
+                        for offset in range(min(i2 - i1, j2 - j1)):
+                            self.unified_pairs.append((old_line + offset, new_line + offset, i1 + offset, j1 + offset))
+                            self.unified_pair_new_lines.append(new_line + offset)
+                    if tag in ('replace', 'delete'):
+                        for line in self.old_lines[i1:i2]:
+                            chunks += ['-' + self.display_line(line, True) + '\n', 'delete']
+                    if tag in ('replace', 'insert'):
+                        for line in self.new_lines[j1:j2]:
+                            chunks += ['+' + self.display_line(line, True) + '\n', 'add']
+
+            # Insert everything in a single call instead of line by line
+            if chunks:
+                self.text_widget.insert(tk.END, *chunks)
+
         self.text_widget.config(state='disabled')
+        self.unified_dirty = False
+        self.highlight_unified_visible()
+
+    def highlight_unified_visible(self):
+        """Add intra-line highlights to the replaced line pairs currently on screen"""
+        if not self.unified_pairs:
+            return
+        top = int(self.text_widget.index('@0,0').split('.')[0])
+        bottom = int(self.text_widget.index(f"@0,{self.text_widget.winfo_height()}").split('.')[0])
+
+        index = bisect.bisect_left(self.unified_pair_new_lines, top)
+        while index < len(self.unified_pairs):
+            old_line, new_line, old_index, new_index = self.unified_pairs[index]
+            if old_line > bottom:
+                break
+            if index not in self.unified_highlighted:
+                self.unified_highlighted.add(index)
+                old_spans, new_spans = self.intraline_spans(old_index, new_index)
+                self.tag_spans(self.text_widget, old_line, 1, old_spans, 'delete_char')
+                self.tag_spans(self.text_widget, new_line, 1, new_spans, 'add_char')
+            index += 1
+
+    # ======== Side-by-side view ========
+
+    def visible_row_count(self):
+        """Number of rows that fit in the side-by-side panes"""
+        height = self.old_text.winfo_height()
+        if height <= 1:
+            return int(self.old_text.cget('height'))
+        return max(height // self.line_height, 1)
+
+    def iter_rows(self, start, end):
+        """Yield (tag, old index, new index) for side-by-side rows in [start, end)"""
+        k = bisect.bisect_right(self.row_starts, start) - 1
+        row = start
+        while row < end and 0 <= k < len(self.opcodes):
+            tag, i1, i2, j1, j2 = self.opcodes[k]
+            offset = row - self.row_starts[k]
+            height = max(i2 - i1, j2 - j1)
+            while offset < height and row < end:
+                old_index = i1 + offset if offset < i2 - i1 else None
+                new_index = j1 + offset if offset < j2 - j1 else None
+                yield tag, old_index, new_index
+                offset += 1
+                row += 1
+            k += 1
+
+    def format_cell(self, lines, index, tag):
+        """Text chunks for one pane cell, a filler row when the line does not exist on this side"""
+        if index is None:
+            return ['\n', 'filler']
+        return [f"{index + 1:>6}  ", ('lineno', tag), self.display_line(lines[index], bool(tag)) + '\n', tag]
+
+    def render_split(self):
+        """Materialise only the visible rows plus a margin in both panes"""
+        if not self.side_by_side.get():
+            return
+
+        if self.message:
+            start, end = 0, 0
+        else:
+            visible = self.visible_row_count()
+            start = max(self.top_row - self.VIEWPORT_MARGIN, 0)
+            end = min(self.top_row + visible + self.VIEWPORT_MARGIN, self.total_rows)
+
+        old_chunks = []
+        new_chunks = []
+        self.split_pairs = {}
+        self.split_highlighted = set()
+        for row, (tag, old_index, new_index) in enumerate(self.iter_rows(start, end), start):
+            if tag == 'replace' and old_index is not None and new_index is not None:
+                self.split_pairs[row] = (old_index, new_index)
+            old_tag = 'delete' if tag != 'equal' else ''
+            new_tag = 'add' if tag != 'equal' else ''
+            old_chunks += self.format_cell(self.old_lines, old_index, old_tag)
+            new_chunks += self.format_cell(self.new_lines, new_index, new_tag)
+
+        if self.message:
+            old_chunks = [self.message, '']
+
+        for widget, chunks in ((self.old_text, old_chunks), (self.new_text, new_chunks)):
+            widget.config(state='normal')
+            widget.delete('1.0', tk.END)
+            if chunks:
+                widget.insert(tk.END, *chunks)
+            widget.config(state='disabled')
+
+        self.rendered_range = (start, end)
+        self.place_split_view()
+
+    def place_split_view(self):
+        """Scroll both panes to the top row and update the scrollbar"""
+        start, _ = self.rendered_range
+        line = f"{self.top_row - start + 1}.0"
+        self.old_text.yview(line)
+        self.new_text.yview(line)
+
+        if self.total_rows:
+            visible = self.visible_row_count()
+            first = self.top_row / self.total_rows
+            last = min((self.top_row + visible) / self.total_rows, 1.0)
+            self.split_scrolly.set(first, last)
+        else:
+            self.split_scrolly.set(0.0, 1.0)
+
+        self.highlight_split_visible()
+
+    def highlight_split_visible(self):
+        """Add intra-line highlights to the replaced rows currently on screen"""
+        start, end = self.rendered_range
+        visible_end = min(self.top_row + self.visible_row_count(), end)
+        for row in range(max(self.top_row, start), visible_end):
+            if row not in self.split_pairs or row in self.split_highlighted:
+                continue
+            self.split_highlighted.add(row)
+            old_index, new_index = self.split_pairs[row]
+            old_spans, new_spans = self.intraline_spans(old_index, new_index)
+            line = row - start + 1
+            # Skip the line number prefix written by format_cell
+            self.tag_spans(self.old_text, line, len(f"{old_index + 1:>6}  "), old_spans, 'delete_char')
+            self.tag_spans(self.new_text, line, len(f"{new_index + 1:>6}  "), new_spans, 'add_char')
+
+    def scroll_to_row(self, row):
+        """Move the side-by-side viewport, re-rendering only when it leaves the materialised rows"""
+        visible = self.visible_row_count()
+        row = max(min(row, self.total_rows - visible), 0)
+        self.top_row = row
+
+        start, end = self.rendered_range
+        if start <= row and (row + visible <= end or end == self.total_rows):
+            self.place_split_view()
+        else:
+            self.render_split()
+
+    def on_split_yscroll(self, *args):
+        """Scrollbar command for the side-by-side panes"""
+        if args[0] == 'moveto':
+            self.scroll_to_row(int(float(args[1]) * self.total_rows))
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount *= self.visible_row_count()
+            self.scroll_to_row(self.top_row + amount)
+
+    def on_split_xscroll(self, *args):
+        """Scroll both panes horizontally together"""
+        self.old_text.xview(*args)
+        self.new_text.xview(*args)
+
+    def on_split_mousewheel(self, event):
+        """Scroll both panes together with the mouse wheel"""
+        if event.num == 4:
+            step = -3
+        elif event.num == 5:
+            step = 3
+        else:
+            step = -3 if event.delta > 0 else 3
+        self.scroll_to_row(self.top_row + step)
+        return 'break'  # Stop the text widget from scrolling on its own
+
+    # ======== Change navigation ========
+
+    def next_change(self):
+        """Jump to the next change"""
+        if self.side_by_side.get():
+            index = bisect.bisect_right(self.change_rows, self.top_row + self.JUMP_CONTEXT)
+            if index < len(self.change_rows):
+                self.scroll_to_row(self.change_rows[index] - self.JUMP_CONTEXT)
+        else:
+            top = self.text_widget.index('@0,0')
+            found = self.text_widget.tag_nextrange('hunk', f"{top} +1 lines linestart")
+            if found:
+                self.text_widget.yview(found[0])
+
+    def prev_change(self):
+        """Jump to the previous change"""
+        if self.side_by_side.get():
+            index = bisect.bisect_left(self.change_rows, self.top_row + self.JUMP_CONTEXT) - 1
+            if index >= 0:
+                self.scroll_to_row(self.change_rows[index] - self.JUMP_CONTEXT)
+        else:
+            top = self.text_widget.index('@0,0')
+            found = self.text_widget.tag_prevrange('hunk', top)
+            if found:
+                self.text_widget.yview(found[0])
@@ -0,0 +1,135 @@
+import codecs
+import os
+import shutil
+
+
+class FileEncodingDetector:
+    """ Detect text file encodings once per file and decode contents for diffing """
+
+    # Byte order marks, UTF-32 must be checked before UTF-16 (FF FE prefix is shared)
+    BOMS = [
+        (codecs.BOM_UTF32_LE, 'utf-32'),
+        (codecs.BOM_UTF32_BE, 'utf-32'),
+        (codecs.BOM_UTF8, 'utf-8-sig'),
+        (codecs.BOM_UTF16_LE, 'utf-16'),
+        (codecs.BOM_UTF16_BE, 'utf-16'),
+    ]
+
+    # Encodings tried in order when there is no BOM (cp950 is the Windows superset of Big5)
+    CANDIDATE_ENCODINGS = ['utf-8', 'cp950', 'big5hkscs', 'cp1252']
+
+    # Number of leading bytes inspected by the UTF-16 / binary heuristic
+    SNIFF_SIZE = 4096
+
+    # (absolute path, size, mtime) -> encoding name, or None for binary/undecodable files
+    _cache = {}
+
+    @staticmethod
+    def _cache_key(path):
+        st = os.stat(path)
+        return (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+    @staticmethod
+    def sniff(data):
+        """Guess the encoding of raw bytes, return None if they look binary or cannot be decoded"""
+        for bom, encoding in FileEncodingDetector.BOMS:
+            if data.startswith(bom):
+                return encoding
+
+        sample = data[:FileEncodingDetector.SNIFF_SIZE]
+        if b'\x00' in sample:
+            # BOM-less UTF-16 has NUL bytes on one side of every ASCII character
+            even_nuls = sample[0::2].count(0)
+            odd_nuls = sample[1::2].count(0)
+            half = max(len(sample) // 2, 1)
+            if odd_nuls / half > 0.3 and even_nuls / half < 0.05:
+                encoding = 'utf-16-le'
+            elif even_nuls / half > 0.3 and odd_nuls / half < 0.05:
+                encoding = 'utf-16-be'
+            else:
+                return None  # NUL bytes without a UTF-16 pattern: binary file
+            try:
+                data.decode(encoding)
+                return encoding
+            except UnicodeDecodeError:
+                return None
+
+        for encoding in FileEncodingDetector.CANDIDATE_ENCODINGS:
+            try:
+                data.decode(encoding)
+                return encoding
+            except UnicodeDecodeError:
+                continue
+        return None
+
+    @staticmethod
+    def read_bytes(path):
+        """Read raw file contents and return (data, encoding), detecting the encoding only once"""
+        key = FileEncodingDetector._cache_key(path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        if key in FileEncodingDetector._cache:
+            return data, FileEncodingDetector._cache[key]
+        encoding = FileEncodingDetector.sniff(data)
+        FileEncodingDetector._cache[key] = encoding
+        return data, encoding
+
+    @staticmethod
+    def detect(path):
+        """Return the detected encoding of a file, or None for binary/undecodable files"""
+        key = FileEncodingDetector._cache_key(path)
+        if key not in FileEncodingDetector._cache:
+            FileEncodingDetector.read_bytes(path)
+        return FileEncodingDetector._cache[key]
+
+    @staticmethod
+    def read_text(path):
+        """Read and decode a file, return (text, encoding); text is None for binary files"""
+        data, encoding = FileEncodingDetector.read_bytes(path)
+        if encoding is None:
+            return None, None
+        return data.decode(encoding), encoding
+
+    @staticmethod
+    def encode(text, encoding, bom_source=b''):
+        """
+        Encode text, keeping the byte order of a UTF-16/32 BOM found at the start of bom_source
+        (the plain 'utf-16'/'utf-32' codecs would always write the native order).
+        """
+        if encoding in ('utf-16', 'utf-32'):
+            for bom, bom_encoding in FileEncodingDetector.BOMS:
+                if bom_encoding == encoding and bom_source.startswith(bom):
+                    byte_order = 'le' if bom in (codecs.BOM_UTF16_LE, codecs.BOM_UTF32_LE) else 'be'
+                    return bom + text.encode(f"{encoding}-{byte_order}")
+        return text.encode(encoding)
+
+    @staticmethod
+    def write_text(path, text, encoding):
+        """
+        Replace a file with text in the given encoding. The text is encoded before anything is written
+        and the file is swapped in through a temporary file, so a failure leaves the original untouched.
+        """
+        bom_source = b''
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                bom_source = f.read(4)
+        data = FileEncodingDetector.encode(text, encoding, bom_source)
+
+        tmp = path + ".writing"
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            if os.path.exists(path):
+                shutil.copymode(path, tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    @staticmethod
+    def read_lines(path):
+        """Read a file as a list of lines (line endings kept), return (lines, encoding)"""
+        text, encoding = FileEncodingDetector.read_text(path)
+        if text is None:
+            return None, None
+        return text.splitlines(keepends=True), encoding
@@ -0,0 +1,368 @@
+import difflib
+import hashlib
+import math
+import os
+from array import array
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from file_encoding import FileEncodingDetector
+
+
+class FileEntry:
+    """ Scan result of one file, keyed by its path relative to the old/new roots """
+
+    def __init__(self, rel_path, old_size=None, new_size=None):
+        self.rel_path = rel_path
+        self.old_size = old_size  # None when the file only exists in the new folder
+        self.new_size = new_size  # None when the file only exists in the old folder
+        self.old_mtime = None  # st_mtime_ns at scan time, used to tell whether cached hashes are still valid
+        self.new_mtime = None
+        self.old_hash = None
+        self.new_hash = None
+        self.status = None  # 'added', 'removed', 'modified' or 'identical'
+        self.moved_from = None  # Old relative path of a moved/renamed file (set on the added side)
+        self.moved_to = None  # New relative path of a moved/renamed file (set on the removed side)
+        self.similarity = None  # 1.0 for exact moves, lower for near-identical ones
+
+
+class FolderSummary:
+    """ Per-folder counts and byte totals of added, removed, modified and identical files """
+
+    STATUSES = ('added', 'removed', 'modified', 'identical')
+
+    def __init__(self):
+        self.counts = dict.fromkeys(FolderSummary.STATUSES, 0)
+        self.sizes = dict.fromkeys(FolderSummary.STATUSES, 0)
+
+    def add_entry(self, entry):
+        self.counts[entry.status] += 1
+        size = entry.old_size if entry.status == 'removed' else entry.new_size
+        self.sizes[entry.status] += size or 0
+
+    def merge(self, other):
+        for status in FolderSummary.STATUSES:
+            self.counts[status] += other.counts[status]
+            self.sizes[status] += other.sizes[status]
+
+    def changed_count(self):
+        return self.counts['added'] + self.counts['removed'] + self.counts['modified']
+
+    def changed_size(self):
+        return self.sizes['added'] + self.sizes['removed'] + self.sizes['modified']
+
+
+class PathIndex:
+    """ Trigram index over relative paths for fast substring and fuzzy search """
+
+    # Share of query trigrams a path must contain to count as a fuzzy match
+    FUZZY_MIN_SHARE = 0.6
+    # A single shared trigram is never a fuzzy match
+    FUZZY_MIN_TRIGRAMS = 2
+
+    def __init__(self, rel_paths):
+        self.paths = sorted(rel_paths)
+        # Search is case-insensitive and uses '/' whatever the platform separator is
+        self.keys = [path.replace(os.sep, '/').lower() for path in self.paths]
+        postings = defaultdict(list)
+        for path_id, key in enumerate(self.keys):
+            for trigram in PathIndex.trigrams(key):
+                postings[trigram].append(path_id)
+        # trigram -> array of path ids in increasing order, compact once building is done
+        self.postings = {trigram: array('I', ids) for trigram, ids in postings.items()}
+
+    @staticmethod
+    def trigrams(text):
+        """Return the set of 3-character substrings of text"""
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def search(self, query, limit=500, accept=None):
+        """
+        Return up to limit paths matching query: substring matches first (shortest paths first),
+        then fuzzy matches ranked by shared trigrams. accept(path) can filter the results.
+        """
+        query = query.replace('\\', '/').lower().strip()
+        accept = accept or (lambda path: True)
+        if not query:
+            return [path for path in self.paths if accept(path)][:limit]
+
+        grams = PathIndex.trigrams(query)
+        if not grams:
+            # Shorter than a trigram: a linear scan over the lower-case keys is fast enough
+            hits = [i for i, key in enumerate(self.keys) if query in key]
+            return self.rank(hits, accept, limit)
+
+        postings = sorted((self.postings.get(g, ()) for g in grams), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(posting)
+        hits = [i for i in candidates if query in self.keys[i]]
+        results = self.rank(hits, accept, limit)
+        if len(results) >= limit:
+            return results
+
+        # Fuzzy: paths sharing most of the query trigrams (typos, missing characters)
+        found = set(hits)
+        scores = Counter()
+        for posting in postings:
+            scores.update(posting)
+        minimum = max(PathIndex.FUZZY_MIN_TRIGRAMS, math.ceil(len(grams) * PathIndex.FUZZY_MIN_SHARE))
+        fuzzy = [(-score, len(self.keys[i]), i) for i, score in scores.items() if score >= minimum and i not in found]
+        for _, _, path_id in sorted(fuzzy):
+            if len(results) >= limit:
+                break
+            if accept(self.paths[path_id]):
+                results.append(self.paths[path_id])
+        return results
+
+    def rank(self, hits, accept, limit):
+        """Order substring hits by path length, then alphabetically"""
+        results = []
+        for path_id in sorted(hits, key=lambda i: (len(self.keys[i]), i)):
+            if len(results) >= limit:
+                break
+            if accept(self.paths[path_id]):
+                results.append(self.paths[path_id])
+        return results
+
+
+class ScanIndex:
+    """ Change detection result for an old/new folder pair """
+
+    def __init__(self, old_root, new_root):
+        self.old_root = old_root
+        self.new_root = new_root
+        self.entries = {}  # relative path -> FileEntry
+        self.moves = {}  # new relative path -> old relative path
+        self.folders = {}  # relative folder path ('' for the root) -> FolderSummary
+        self.path_index = PathIndex([])
+
+    def get(self, rel_path):
+        """Return the entry of a relative path, or None"""
+        return self.entries.get(rel_path)
+
+    def get_summary(self, folder_path):
+        """Return the FolderSummary of a relative folder path (empty if it holds no files)"""
+        return self.folders.get(folder_path) or FolderSummary()
+
+    def build_folder_summaries(self):
+        """Aggregate file statuses into every folder bottom-up, visiting each folder once"""
+        self.folders = {'': FolderSummary()}
+        direct = {}
+        for entry in self.entries.values():
+            folder = os.path.dirname(entry.rel_path)
+            direct.setdefault(folder, FolderSummary()).add_entry(entry)
+            # Make sure every ancestor has a summary
+            while folder not in self.folders:
+                self.folders[folder] = FolderSummary()
+                folder = os.path.dirname(folder)
+
+        # Deepest folders first, so each child is complete before it is merged into its parent
+        for folder in sorted(self.folders, key=lambda f: f.count(os.sep) + (1 if f else 0), reverse=True):
+            if folder in direct:
+                self.folders[folder].merge(direct[folder])
+            if folder:
+                self.folders[os.path.dirname(folder)].merge(self.folders[folder])
+
+    def search(self, query, statuses=None, limit=500):
+        """Search relative paths, optionally keeping only the given change statuses"""
+        accept = None
+        if statuses:
+            accept = lambda path: self.entries[path].status in statuses
+        return self.path_index.search(query, limit, accept)
+
+    def get_hash(self, rel_path, side):
+        """Return the cached hash of a file on the 'old' or 'new' side, hashing it on first use"""
+        entry = self.entries.get(rel_path)
+        if entry is None:
+            return None
+        attr = 'old_hash' if side == 'old' else 'new_hash'
+        if getattr(entry, attr) is None:
+            root = self.old_root if side == 'old' else self.new_root
+            path = os.path.join(root, rel_path)
+            if os.path.isfile(path):
+                setattr(entry, attr, FolderScanner.hash_file(path))
+        return getattr(entry, attr)
+
+
+class FolderScanner:
+    """ Walk an old and a new folder and classify every file """
+
+    BLOCK_SIZE = 1024 * 1024
+    HASH_WORKERS = 8
+    # Near-identical moves: minimum line similarity and largest file compared
+    SIMILARITY_THRESHOLD = 0.9
+    SIMILARITY_MAX_SIZE = 1024 * 1024
+    # Removed files with the same name compared per added file, closest sizes first
+    SIMILARITY_MAX_CANDIDATES = 20
+
+    @staticmethod
+    def hash_file(path):
+        """Return the SHA-256 hex digest of a file"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(FolderScanner.BLOCK_SIZE), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def list_files(root):
+        """Return {relative path: (size, st_mtime_ns)} of all files below root"""
+        files = {}
+        if not root or not os.path.isdir(root):
+            return files
+        for current, dirs, names in os.walk(root):
+            for name in names:
+                path = os.path.join(current, name)
+                try:
+                    st = os.stat(path)
+                    files[os.path.relpath(path, root)] = (st.st_size, st.st_mtime_ns)
+                except OSError as e:
+                    print(f"Scan fail: {path}, {e}")
+        return files
+
+    @staticmethod
+    def hash_entries(index, jobs):
+        """Hash (entry, side) pairs on a thread pool and store the results on the entries"""
+        jobs = [(entry, side) for entry, side in jobs
+                if getattr(entry, 'old_hash' if side == 'old' else 'new_hash') is None]
+        if not jobs:
+            return
+
+        def work(job):
+            entry, side = job
+            root = index.old_root if side == 'old' else index.new_root
+            try:
+                return FolderScanner.hash_file(os.path.join(root, entry.rel_path))
+            except OSError as e:
+                print(f"Hash fail: {entry.rel_path}, {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=FolderScanner.HASH_WORKERS) as executor:
+            for (entry, side), digest in zip(jobs, executor.map(work, jobs)):
+                setattr(entry, 'old_hash' if side == 'old' else 'new_hash', digest)
+
+    @staticmethod
+    def scan(old_root, new_root, detect_similar=True):
+        """Build a ScanIndex: classify files and detect moved/renamed files"""
+        index = ScanIndex(old_root, new_root)
+        old_files = FolderScanner.list_files(old_root)
+        new_files = FolderScanner.list_files(new_root)
+
+        for rel_path in set(old_files) | set(new_files):
+            old_size, old_mtime = old_files.get(rel_path, (None, None))
+            new_size, new_mtime = new_files.get(rel_path, (None, None))
+            entry = FileEntry(rel_path, old_size, new_size)
+            entry.old_mtime = old_mtime
+            entry.new_mtime = new_mtime
+            index.entries[rel_path] = entry
+
+        # Files on both sides: different size means modified, otherwise compare hashes
+        jobs = []
+        for entry in index.entries.values():
+            if entry.old_size is None:
+                entry.status = 'added'
+            elif entry.new_size is None:
+                entry.status = 'removed'
+            elif entry.old_size != entry.new_size:
+                entry.status = 'modified'
+            else:
+                jobs += [(entry, 'old'), (entry, 'new')]
+        FolderScanner.hash_entries(index, jobs)
+        for entry, _ in jobs[::2]:
+            same = entry.old_hash is not None and entry.old_hash == entry.new_hash
+            entry.status = 'identical' if same else 'modified'
+
+        FolderScanner.detect_moves(index, detect_similar)
+        index.build_folder_summaries()
+        index.path_index = PathIndex(index.entries)
+        return index
+
+    @staticmethod
+    def detect_moves(index, detect_similar=True):
+        """Pair removed and added files by content hash, then optionally by similarity"""
+        removed = [e for e in index.entries.values() if e.status == 'removed']
+        added = [e for e in index.entries.values() if e.status == 'added']
+        if not removed or not added:
+            return
+
+        # Only files whose size occurs on both sides can be exact moves
+        removed_sizes = {e.old_size for e in removed}
+        added_sizes = {e.new_size for e in added}
+        shared_sizes = removed_sizes & added_sizes
+        jobs = [(e, 'old') for e in removed if e.old_size in shared_sizes]
+        jobs += [(e, 'new') for e in added if e.new_size in shared_sizes]
+        FolderScanner.hash_entries(index, jobs)
+
+        by_hash = {}
+        for entry in removed:
+            if entry.old_hash is not None:
+                by_hash.setdefault(entry.old_hash, []).append(entry)
+
+        # Prefer a source with the same file name when several removed files share a hash
+        for entry in sorted(added, key=lambda e: e.rel_path):
+            candidates = by_hash.get(entry.new_hash) if entry.new_hash else None
+            if not candidates:
+                continue
+            name = os.path.basename(entry.rel_path)
+            source = next((c for c in candidates if os.path.basename(c.rel_path) == name), candidates[0])
+            candidates.remove(source)
+            FolderScanner.mark_move(index, source, entry, 1.0)
+
+        if detect_similar:
+            FolderScanner.detect_similar_moves(index)
+
+    @staticmethod
+    def detect_similar_moves(index):
+        """Pair remaining removed and added text files with the same name and near-identical content"""
+        removed_by_name = {}
+        for entry in index.entries.values():
+            if entry.status == 'removed' and entry.moved_to is None \
+                    and entry.old_size <= FolderScanner.SIMILARITY_MAX_SIZE:
+                removed_by_name.setdefault(os.path.basename(entry.rel_path), []).append(entry)
+
+        # Lines of removed files, read at most once during this stage
+        old_lines_cache = {}
+        for entry in sorted(index.entries.values(), key=lambda e: e.rel_path):
+            if entry.status != 'added' or entry.moved_from is not None \
+                    or entry.new_size > FolderScanner.SIMILARITY_MAX_SIZE:
+                continue
+            candidates = removed_by_name.get(os.path.basename(entry.rel_path))
+            if not candidates:
+                continue
+            new_lines, _ = FileEncodingDetector.read_lines(os.path.join(index.new_root, entry.rel_path))
+            if new_lines is None:
+                continue
+
+            # The added file is indexed once as the second sequence and compared with every candidate
+            matcher = difflib.SequenceMatcher(None, b=new_lines)
+            nearest = sorted(candidates, key=lambda c: abs(c.old_size - entry.new_size))
+            best, best_ratio = None, FolderScanner.SIMILARITY_THRESHOLD
+            for candidate in nearest[:FolderScanner.SIMILARITY_MAX_CANDIDATES]:
+                if candidate.rel_path not in old_lines_cache:
+                    old_lines_cache[candidate.rel_path], _ = FileEncodingDetector.read_lines(
+                        os.path.join(index.old_root, candidate.rel_path))
+                old_lines = old_lines_cache[candidate.rel_path]
+                if old_lines is None:
+                    continue
+                matcher.set_seq1(old_lines)
+                # Cheap upper bounds first, the full ratio only when they pass
+                if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+                    continue
+                ratio = matcher.ratio()
+                if ratio >= best_ratio:
+                    best, best_ratio = candidate, ratio
+
+            if best is not None:
+                candidates.remove(best)
+                FolderScanner.mark_move(index, best, entry, best_ratio)
+
+    @staticmethod
+    def mark_move(index, source, target, similarity):
+        """Record that the removed entry source was moved to the added entry target"""
+        source.moved_to = target.rel_path
+        target.moved_from = source.rel_path
+        source.similarity = target.similarity = similarity
+        index.moves[target.rel_path] = source.rel_path
@@ -2,6 +2,18 @@ import tkinter as tk
 import os
 
 class FileTreeWidget:
+    # Change status filters offered next to the search box
+    STATUS_FILTERS = {
+        "All": None,
+        "Changed": {'added', 'removed', 'modified'},
+        "Added": {'added'},
+        "Removed": {'removed'},
+        "Modified": {'modified'},
+        "Identical": {'identical'},
+    }
+    SEARCH_LIMIT = 500
+    SEARCH_DELAY_MS = 150
+
     @staticmethod
     def get_file_structure(old_path, new_path):
         """Build file structure dictionary"""
@@ -57,10 +69,44 @@ class FileTreeWidget:
         self.parent = parent
         self.on_file_click = on_file_click
         self.file_vars = {}
+        self.check_states = {}  # path -> checked, kept for items hidden by a filter across rebuilds
         self.folder_states = {}
         self.folder_frames = {}
+        self.folder_buttons = {}
         self.selected_files = {}
         self.last_selected = None
+        self.scan_index = None
+        self.structure = {}
+        self.hide_unchanged = tk.BooleanVar(value=False)
+        self.status_filter = tk.StringVar(value="All")
+        self.search_job = None
+        self.search_results = []
+
+        # Create toolbar
+        self.toolbar = tk.Frame(parent)
+        self.toolbar.pack(side=tk.TOP, fill=tk.X)
+        hide_chk = tk.Checkbutton(self.toolbar, text="Hide unchanged",
+                                  variable=self.hide_unchanged, command=self.rebuild_tree)
+        hide_chk.pack(side=tk.LEFT, padx=5)
+
+        # Search box and change status filter
+        search_row = tk.Frame(parent)
+        search_row.pack(side=tk.TOP, fill=tk.X)
+        tk.Label(search_row, text="Search:").pack(side=tk.LEFT, padx=5)
+        self.search_entry = tk.Entry(search_row)
+        self.search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.search_entry.bind('<KeyRelease>', lambda e: self.schedule_search())
+        status_menu = tk.OptionMenu(search_row, self.status_filter, *self.STATUS_FILTERS,
+                                    command=lambda value: self.run_search())
+        status_menu.pack(side=tk.LEFT, padx=5)
+
+        # Search results, only shown while a search or filter is active
+        self.results_frame = tk.Frame(parent)
+        self.results_label = tk.Label(self.results_frame, anchor='w')
+        self.results_label.pack(side=tk.TOP, fill=tk.X, padx=5)
+        self.results_list = tk.Listbox(self.results_frame, height=8)
+        self.results_list.pack(side=tk.TOP, fill=tk.X, padx=5)
+        self.results_list.bind('<<ListboxSelect>>', lambda e: self.on_result_select())
         
         # Create scrollbar
         self.scrollbar = tk.Scrollbar(parent)
@@ -79,15 +125,69 @@ class FileTreeWidget:
         self.canvas.create_window((0, 0), window=self.inner_frame, anchor='nw')
         self.inner_frame.bind('<Configure>', lambda e: self.canvas.configure(scrollregion=self.canvas.bbox('all')))
 
+    @staticmethod
+    def format_size(size):
+        """Format a byte count for display"""
+        for unit in ('B', 'KB', 'MB', 'GB'):
+            if size < 1024 or unit == 'GB':
+                return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+            size /= 1024
+
+    def format_summary(self, folder_path):
+        """Return the change summary shown next to a folder name"""
+        summary = self.scan_index.get_summary(folder_path)
+        counts = summary.counts
+        text = f"  +{counts['added']} -{counts['removed']} ~{counts['modified']} ={counts['identical']}"
+        if summary.changed_count():
+            text += f"  ({self.format_size(summary.changed_size())} changed)"
+        return text
+
+    def is_hidden(self, full_path, is_dir):
+        """Unchanged files and folders without changes are not rendered when hiding unchanged"""
+        if not (self.hide_unchanged.get() and self.scan_index):
+            return False
+        if is_dir:
+            return self.scan_index.get_summary(full_path).changed_count() == 0
+        entry = self.scan_index.get(full_path)
+        return entry is not None and entry.status == 'identical'
+
+    def build_tree(self, structure):
+        """Clear the tree and create it from a file structure"""
+        self.structure = structure
+        self.file_vars = {}
+        self.check_states = {}  # A new folder pair starts with everything checked
+        self.rebuild_tree()
+        self.run_search()  # Refresh results against the new scan
+
+    def rebuild_tree(self):
+        """Recreate the tree widgets, keeping the check state of every item, including hidden ones"""
+        for path, var in self.file_vars.items():
+            self.check_states[path] = var.get()
+        for child in self.inner_frame.winfo_children():
+            child.destroy()
+        self.file_vars = {}
+        self.folder_states = {}
+        self.folder_frames = {}
+        self.folder_buttons = {}
+        self.selected_files = {}
+        self.last_selected = None
+
+        self.create_tree_items(self.inner_frame, self.structure)
+        self.canvas.yview_moveto(0)
+
     def create_tree_items(self, parent, structure, path='', level=0):
         """Recursively create tree structure GUI elements"""
         # Separate directories and files
         directories = [(name, struct) for name, struct in structure.items() if struct is not None]
         files = [(name, struct) for name, struct in structure.items() if struct is None]
+        # Items never shown before follow their folder's check box
+        default_checked = self.file_vars[path].get() if path in self.file_vars else True
         
         # Process directories first
         for name, substructure in sorted(directories):
             full_path = os.path.join(path, name) if path else name
+            if self.is_hidden(full_path, True):
+                continue  # Unchanged subtrees are never rendered
             
             # Create folder main container
             folder_container = tk.Frame(parent)
@@ -101,7 +201,7 @@ class FileTreeWidget:
             indent = '    ' * level
             
             # Create checkbutton variable
-            self.file_vars[full_path] = tk.BooleanVar(value=True)
+            self.file_vars[full_path] = tk.BooleanVar(value=self.check_states.get(full_path, default_checked))
             
             # Initialize folder state (default collapsed)
             self.folder_states[full_path] = tk.BooleanVar(value=False)
@@ -109,13 +209,16 @@ class FileTreeWidget:
             # Create expand/collapse button
             toggle_btn = tk.Label(folder_header, text="▶️", cursor="hand2")
             toggle_btn.pack(side=tk.LEFT, padx=(indent.count(' ') * 2, 0))
+            self.folder_buttons[full_path] = toggle_btn
             
             # Bind click event
             toggle_btn.bind('<Button-1>', lambda e, path=full_path, btn=toggle_btn: 
                         self.toggle_folder(path, btn))
             
-            # Folder icon and name
+            # Folder icon, name and change summary
             text = f"📁 {name}"
+            if self.scan_index:
+                text += self.format_summary(full_path)
             
             def make_check_handler(current_path):
                 def handler():
@@ -146,16 +249,25 @@ class FileTreeWidget:
         # Process files next
         for name, _ in sorted(files):
             full_path = os.path.join(path, name) if path else name
+            if self.is_hidden(full_path, False):
+                continue
             
             # Create file container frame
             item_frame = tk.Frame(parent)
             item_frame.pack(fill=tk.X, side=tk.TOP)
             
             # Create checkbutton variable
-            self.file_vars[full_path] = tk.BooleanVar(value=True)
+            self.file_vars[full_path] = tk.BooleanVar(value=self.check_states.get(full_path, default_checked))
             
-            # Create clickable label
+            # Create clickable label, marking files detected as moved/renamed
             text = f"📄 {name}"
+            entry = self.scan_index.get(full_path) if self.scan_index else None
+            if entry is not None and (entry.moved_from or entry.moved_to):
+                similarity = f" ({entry.similarity:.0%})" if entry.similarity < 1.0 else ""
+                if entry.moved_from:
+                    text += f"  ⇐ moved from {entry.moved_from}{similarity}"
+                else:
+                    text += f"  ⇒ moved to {entry.moved_to}{similarity}"
             label = tk.Label(item_frame, text=text, cursor="hand2")
             label.pack(side=tk.LEFT, padx=((level + 1) * 20, 5), anchor='w')
             
@@ -169,6 +281,67 @@ class FileTreeWidget:
             # Save label reference
             self.selected_files[full_path] = {'label': label, 'frame': item_frame}
 
+    def set_scan_index(self, scan_index):
+        """Set the change detection result used to annotate tree items"""
+        self.scan_index = scan_index
+
+    def schedule_search(self):
+        """Run the search shortly after typing stops"""
+        if self.search_job:
+            self.parent.after_cancel(self.search_job)
+        self.search_job = self.parent.after(self.SEARCH_DELAY_MS, self.run_search)
+
+    def run_search(self):
+        """Search the path index and list matching files"""
+        self.search_job = None
+        query = self.search_entry.get()
+        statuses = self.STATUS_FILTERS[self.status_filter.get()]
+        if not query.strip() and statuses is None:
+            self.results_frame.pack_forget()
+            return
+
+        self.search_results = self.scan_index.search(query, statuses, self.SEARCH_LIMIT) if self.scan_index else []
+        self.results_list.delete(0, tk.END)
+        if self.search_results:
+            self.results_list.insert(tk.END, *self.search_results)
+        more = "+" if len(self.search_results) >= self.SEARCH_LIMIT else ""
+        self.results_label.config(text=f"{len(self.search_results)}{more} matches")
+        self.results_frame.pack(side=tk.TOP, fill=tk.X, before=self.scrollbar)
+
+    def on_result_select(self):
+        """Reveal the selected search result in the tree"""
+        selection = self.results_list.curselection()
+        if selection:
+            self.reveal_path(self.search_results[selection[0]])
+
+    def reveal_path(self, file_path):
+        """Expand the folders above a file, scroll to it and select it"""
+        if file_path not in self.selected_files and self.hide_unchanged.get():
+            # The file is hidden as unchanged, show everything again
+            self.hide_unchanged.set(False)
+            self.rebuild_tree()
+        if file_path not in self.selected_files:
+            return
+
+        ancestors = []
+        folder = os.path.dirname(file_path)
+        while folder:
+            ancestors.append(folder)
+            folder = os.path.dirname(folder)
+        for folder in reversed(ancestors):
+            if folder in self.folder_states and not self.folder_states[folder].get():
+                self.toggle_folder(folder, self.folder_buttons[folder])
+
+        self.on_file_click(file_path)
+
+        # Scroll the canvas so the file is visible
+        self.canvas.update_idletasks()
+        frame = self.selected_files[file_path]['frame']
+        y = frame.winfo_rooty() - self.inner_frame.winfo_rooty()
+        height = self.inner_frame.winfo_height()
+        if height > 0:
+            self.canvas.yview_moveto(max(y - 20, 0) / height)
+
     def toggle_folder(self, folder_path, toggle_btn):
         """Toggle folder expand/collapse state"""
         current_state = self.folder_states[folder_path].get()
@@ -187,10 +360,13 @@ class FileTreeWidget:
                 self.folder_frames[folder_path].pack_forget()
 
     def toggle_children(self, folder_path, checked):
-        """Toggle checked state of all children in folder"""
+        """Toggle checked state of all children in folder, including children hidden by a filter"""
         for path, var in self.file_vars.items():
             if path.startswith(folder_path + os.sep):
                 var.set(checked)
+        for path in self.check_states:
+            if path.startswith(folder_path + os.sep):
+                self.check_states[path] = checked
 
     def highlight_selected_file(self, file_path):
         """Highlight selected file"""
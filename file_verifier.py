@@ -0,0 +1,50 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from file_scanner import FolderScanner
+
+
+class FileVerifier:
+    """ Check that files written by an update match their sources """
+
+    WORKERS = 8
+
+    @staticmethod
+    def source_hash(rel_path, src, scan_index):
+        """Hash of a source file, reusing the hash from change detection while the file is unchanged"""
+        entry = scan_index.get(rel_path) if scan_index else None
+        st = os.stat(src)
+        if entry is not None and entry.new_size == st.st_size and entry.new_mtime == st.st_mtime_ns:
+            return scan_index.get_hash(rel_path, 'new')
+        return FolderScanner.hash_file(src)
+
+    @staticmethod
+    def check(rel_path, src, dst, scan_index):
+        """Return a mismatch reason for one written file, or None if it matches its source"""
+        try:
+            if not os.path.isfile(dst):
+                return "missing"
+            if os.path.getsize(dst) != os.path.getsize(src):
+                return "size differs"
+            if FolderScanner.hash_file(dst) != FileVerifier.source_hash(rel_path, src, scan_index):
+                return "content differs"
+        except OSError as e:
+            return f"cannot read: {e}"
+        return None
+
+    @staticmethod
+    def verify(files, scan_index=None):
+        """
+        Hash (relative path, source, destination) triples on a thread pool.
+        Return a list of (relative path, reason) for files that do not match.
+        """
+        def work(job):
+            rel_path, src, dst = job
+            return FileVerifier.check(rel_path, src, dst, scan_index)
+
+        failures = []
+        with ThreadPoolExecutor(max_workers=FileVerifier.WORKERS) as executor:
+            for (rel_path, _, _), reason in zip(files, executor.map(work, files)):
+                if reason:
+                    failures.append((rel_path, reason))
+        return failures
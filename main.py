@@ -2,9 +2,10 @@
 import os
 import shutil
 import stat
-import re
 import difflib
 import configparser
+import threading
+import zipfile
 from datetime import datetime
 
 # ======== Tkinter GUI ========
@@ -15,9 +16,16 @@ from tkinter import filedialog, messagebox
 from file_tree import FileTreeWidget
 from file_compare import FileCompareWidget
 from pdf_report import PDFReportGenerator  # Import a separate PDF generation module
+from file_encoding import FileEncodingDetector
+from file_scanner import FolderScanner
+from patch_bundle import PatchBundle, PatchError
+from file_verifier import FileVerifier
 
 
 class FileUpdateTool:
+    # How often a running background folder scan is checked for completion
+    SCAN_POLL_MS = 100
+
     def __init__(self):
         self.window = tk.Tk()
         self.window.title("File Replacer")
@@ -28,10 +36,21 @@ class FileUpdateTool:
         
         # Store the latest backup folder path
         self.latest_backup_folder = None
+
+        # Change detection result of the current old/new folder pair
+        self.scan_index = None
+        # Folder scans run in a background thread, only the latest one is applied
+        self.scan_id = 0
+        self.scanning = False
+
+        # Hash every written file against its source after a full update
+        self.verify_after_update = tk.BooleanVar(value=True)
         
         # Store button references
         self.update_button = None
         self.update_new_only_button = None
+        self.apply_patch_button = None
+        self.export_patch_button = None
 
         self.create_gui()
         self.update_file_list()  # Load file list immediately for testing
@@ -52,6 +71,8 @@ class FileUpdateTool:
         select_old_button.pack(side=tk.LEFT, padx=5)
         select_new_button = tk.Button(row1, text="Select New Folder", command=self.select_new_folder)
         select_new_button.pack(side=tk.LEFT, padx=5)
+        self.scan_status_label = tk.Label(row1, text="", fg="grey")
+        self.scan_status_label.pack(side=tk.LEFT, padx=5)
         
         # Row 2: OP label and OP input field
         row2 = tk.Frame(left_top_frame)
@@ -155,23 +176,37 @@ class FileUpdateTool:
         self.update_new_only_button = tk.Button(button_frame, text="Update New Lines Only", command=self.update_with_new_lines_only, state=tk.DISABLED)
         self.update_new_only_button.grid(row=0, column=1, padx=5)
 
+        verify_check = tk.Checkbutton(button_frame, text="Verify after update", variable=self.verify_after_update)
+        verify_check.grid(row=0, column=4, padx=5)
+
+        self.export_patch_button = tk.Button(button_frame, text="Export Patch", command=self.export_patch)
+        self.export_patch_button.grid(row=0, column=2, padx=5)
+
+        self.apply_patch_button = tk.Button(button_frame, text="Apply Patch", command=self.apply_patch, state=tk.DISABLED)
+        self.apply_patch_button.grid(row=0, column=3, padx=5)
+
 
     def update_button_states(self):
         """Update button enable/disable states"""
         current_text = self.op_entry.get()
-        if current_text and current_text != "Enter your OP ID":
+        self.export_patch_button.config(state=tk.DISABLED if self.scanning else tk.NORMAL)
+        if current_text and current_text != "Enter your OP ID" and not self.scanning:
             self.update_button.config(state=tk.NORMAL)
             self.update_new_only_button.config(state=tk.NORMAL)
+            self.apply_patch_button.config(state=tk.NORMAL)
         else:
             self.update_button.config(state=tk.DISABLED)
             self.update_new_only_button.config(state=tk.DISABLED)
+            self.apply_patch_button.config(state=tk.DISABLED)
     
     def on_file_click(self, file_path):
         """Handle file click event"""
         self.file_tree.highlight_selected_file(file_path)
 
-        # Update compare UI
-        old_path = os.path.join(self.old_folder_path.get(), file_path)
+        # Update compare UI, comparing moved files against their old location
+        entry = self.scan_index.get(file_path) if self.scan_index else None
+        old_file = entry.moved_from if entry and entry.moved_from else file_path
+        old_path = os.path.join(self.old_folder_path.get(), old_file)
         new_path = os.path.join(self.new_folder_path.get(), file_path)
         self.file_compare.show_diff(old_path, new_path)
 
@@ -203,7 +238,8 @@ class FileUpdateTool:
                 shutil.copytree(src, dst)
                 self.make_writable(dst)
             else:
-                # Copy file
+                # Copy file, creating missing parent folders
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
                 shutil.copy2(src, dst)
                 self.make_writable(dst)
             return True
@@ -211,6 +247,64 @@ class FileUpdateTool:
             print(f"Copy fail : {e}")
             return False
 
+    def apply_move(self, old_folder, filename):
+        """Apply a detected move as a rename inside the old folder, return True if it was renamed"""
+        entry = self.scan_index.get(filename) if self.scan_index else None
+        if entry is None or entry.moved_from is None:
+            return False
+
+        src = os.path.join(old_folder, entry.moved_from)
+        dst = os.path.join(old_folder, filename)
+        if not os.path.isfile(src) or os.path.exists(dst):
+            return False
+        try:
+            self.make_writable(src)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            os.replace(src, dst)
+            print(f"Moved : {entry.moved_from} -> {filename}")
+            return True
+        except Exception as e:
+            print(f"Move fail : {e}")
+            return False
+
+    def delete_removed_files(self, old_folder, new_folder, file_vars):
+        """
+        Delete files that no longer exist in the new folder from checked folders of the old folder,
+        the way replacing the whole folder used to. Moved files and unchecked files are kept.
+        Return the number of deleted files.
+        """
+        if not self.scan_index:
+            return 0
+        checked_folders = {path for path, var in file_vars.items()
+                           if var.get() and os.path.isdir(os.path.join(new_folder, path))}
+
+        deleted_count = 0
+        for entry in self.scan_index.entries.values():
+            if entry.status != 'removed' or entry.moved_to is not None:
+                continue
+            var = file_vars.get(entry.rel_path)
+            if var is not None and not var.get():
+                continue
+
+            # Only files below a checked folder that still exists in the new folder
+            folder = os.path.dirname(entry.rel_path)
+            while folder and folder not in checked_folders:
+                folder = os.path.dirname(folder)
+            if not folder:
+                continue
+
+            old_file = os.path.join(old_folder, entry.rel_path)
+            if not os.path.isfile(old_file):
+                continue
+            try:
+                self.make_writable(old_file)
+                os.remove(old_file)
+                print(f"Delete success : {entry.rel_path}")
+                deleted_count += 1
+            except Exception as e:
+                print(f"Delete fail : {entry.rel_path}, {e}")
+        return deleted_count
+
     def select_old_folder(self):
         folder_selected = filedialog.askdirectory()
         if folder_selected:
@@ -230,10 +324,47 @@ class FileUpdateTool:
         new_path = self.new_folder_path.get()
 
         if old_path and new_path:
-            # create file structure
-            file_structure = FileTreeWidget.get_file_structure(old_path, new_path)
-            # create folder tree
-            self.file_tree.create_tree_items(self.file_tree.inner_frame, file_structure)
+            # detect changes, moved files and the file structure off the UI thread
+            self.scan_id += 1
+            scan_id = self.scan_id
+            result = {}
+
+            def work():
+                try:
+                    result['index'] = FolderScanner.scan(old_path, new_path)
+                    result['structure'] = FileTreeWidget.get_file_structure(old_path, new_path)
+                except Exception as e:
+                    result['error'] = e
+
+            thread = threading.Thread(target=work, daemon=True)
+            thread.start()
+            self.set_scanning(True)
+            self.window.after(self.SCAN_POLL_MS, self.finish_scan, thread, scan_id, result)
+
+    def set_scanning(self, scanning):
+        """Show a busy state and block updates while a folder scan runs"""
+        self.scanning = scanning
+        self.window.config(cursor="watch" if scanning else "")
+        self.scan_status_label.config(text="Scanning folders..." if scanning else "")
+        self.update_button_states()
+
+    def finish_scan(self, thread, scan_id, result):
+        """Poll a background scan and build the tree on the UI thread once it is done"""
+        if thread.is_alive():
+            self.window.after(self.SCAN_POLL_MS, self.finish_scan, thread, scan_id, result)
+            return
+        if scan_id != self.scan_id:
+            return  # A newer scan was started, it will update the tree
+
+        self.set_scanning(False)
+        if 'error' in result:
+            messagebox.showerror("Error", f"Scan folders failed: {result['error']}")
+            return
+
+        self.scan_index = result['index']
+        self.file_tree.set_scan_index(self.scan_index)
+        # create folder tree
+        self.file_tree.build_tree(result['structure'])
 
     def backup_old_folder(self):
         old_path = self.old_folder_path.get()
@@ -269,6 +400,9 @@ class FileUpdateTool:
 
         success_count = 0
         fail_count = 0
+        moved_count = 0
+        written_files = []  # (relative path, source, destination) of every file that landed
+        copy_failed = []  # (relative path, source, destination) of files that could not be copied
 
         # update files
         file_vars = self.file_tree.get_file_vars()
@@ -277,23 +411,81 @@ class FileUpdateTool:
                 old_file = os.path.join(old_path, filename)
                 new_file = os.path.join(new_path, filename)
 
+                if os.path.isdir(new_file):
+                    # Folders are updated file by file so moved files are not copied again
+                    try:
+                        if os.path.isfile(old_file):
+                            # A file in the old folder became a folder in the new one
+                            self.make_writable(old_file)
+                            os.remove(old_file)
+                        os.makedirs(old_file, exist_ok=True)
+                    except Exception as e:
+                        print(f"Update fail: {filename}, Fail: {e}")
+                        fail_count += 1
+                    continue
+
                 if os.path.exists(new_file):
+                    # Moved files are renamed inside the old folder, exact moves need no copy
+                    if self.apply_move(old_path, filename):
+                        moved_count += 1
+                        if self.scan_index.get(filename).similarity == 1.0:
+                            print(f"Move success : {filename}")
+                            success_count += 1
+                            written_files.append((filename, new_file, old_file))
+                            continue
+
                     if self.copy_with_permissions(new_file, old_file):
                         print(f"Update success : {filename}")
                         success_count += 1
+                        written_files.append((filename, new_file, old_file))
                     else:
                         print(f"Update fail: {filename}")
                         fail_count += 1
+                        copy_failed.append((filename, new_file, old_file))
+
+        # Checked folders mirror the new folder: files removed in the new release are deleted
+        deleted_count = self.delete_removed_files(old_path, new_path, file_vars)
 
         # Show update result
-        message = f"Update completed\nSuccess : {success_count} files\nFail : {fail_count} files"
+        message = f"Update completed\nSuccess : {success_count} files\nFail : {fail_count} files\nMoved : {moved_count} files\nDeleted : {deleted_count} files"
+
+        verify_failures = None
+        if self.verify_after_update.get():
+            verify_failures = self.verify_written_files(written_files, copy_failed)
+            message += f"\nVerify failed : {len(verify_failures)} files"
+            message += "".join(f"\n  {name} ({reason})" for name, reason in verify_failures[:10])
         messagebox.showinfo("Update result", message)
         
         # Automatically Generate a PDF Report
-        self.auto_generate_pdf()
+        self.auto_generate_pdf(verify_failures=verify_failures)
         
         print("Update completed.")
 
+    def verify_written_files(self, written_files, copy_failed=()):
+        """
+        Hash written files against their sources, offering to copy the mismatches and the files
+        that could not be copied again. Return the list of (relative path, reason) still failing.
+        """
+        failures = [(filename, "copy failed") for filename, _, _ in copy_failed]
+        failures += FileVerifier.verify(written_files, self.scan_index)
+        candidates = list(written_files) + list(copy_failed)
+        while failures:
+            listing = "\n".join(f"{name} ({reason})" for name, reason in failures[:10])
+            if not messagebox.askyesno("Verify", f"{len(failures)} files failed verification:\n{listing}\n\nRetry failed files?"):
+                break
+            failed = {name for name, _ in failures}
+            copied = []
+            failures = []
+            for filename, new_file, old_file in candidates:
+                if filename not in failed:
+                    continue
+                if self.copy_with_permissions(new_file, old_file):
+                    copied.append((filename, new_file, old_file))
+                else:
+                    failures.append((filename, "copy failed"))
+            failures += FileVerifier.verify(copied, self.scan_index)
+        return failures
+
     def update_with_new_lines_only(self):
         """
         Only add completely new lines from the new file to the old file, ignoring modified lines.
@@ -321,11 +513,14 @@ class FileUpdateTool:
                 new_file = os.path.join(new_folder, filename)
                 if os.path.exists(new_file):
                     try:
-                        # Read the content of the old and new files (line by line)
-                        with open(old_file, 'r', encoding='utf-8') as f:
-                            old_lines = f.readlines()
-                        with open(new_file, 'r', encoding='utf-8') as f:
-                            new_lines = f.readlines()
+                        # Bring a moved file to its new place before merging lines into it
+                        self.apply_move(old_folder, filename)
+
+                        # Read the content of the old and new files (line by line, in their own encodings)
+                        old_lines, old_encoding = FileEncodingDetector.read_lines(old_file)
+                        new_lines, _ = FileEncodingDetector.read_lines(new_file)
+                        if old_lines is None or new_lines is None:
+                            raise ValueError("binary or undecodable file")
 
                         # Use difflib.ndiff() to get line differences
                         diff = list(difflib.ndiff(old_lines, new_lines))
@@ -358,8 +553,7 @@ class FileUpdateTool:
 
                         # Update the old file only if there are new lines
                         if added_lines:
-                            with open(old_file, 'w', encoding='utf-8') as f:
-                                f.writelines(old_lines)
+                            FileEncodingDetector.write_text(old_file, ''.join(old_lines), old_encoding)
 
                         print(f"Update success: {filename}")
                         success_count += 1
@@ -376,6 +570,76 @@ class FileUpdateTool:
 
         print("Update completed.")
 
+    def export_patch(self):
+        """Export the changes of the selected files as a compressed patch bundle"""
+        old_folder = self.old_folder_path.get()
+        new_folder = self.new_folder_path.get()
+        if not (old_folder and new_folder and self.scan_index):
+            messagebox.showerror("Error", "Please select old and new folder.")
+            return
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        bundle_path = filedialog.asksaveasfilename(
+            defaultextension=".rpatch",
+            initialfile=f"{os.path.basename(new_folder)}_{timestamp}.rpatch",
+            filetypes=[("Replacer patch", "*.rpatch"), ("All files", "*.*")]
+        )
+        if not bundle_path:
+            return
+
+        file_vars = self.file_tree.get_file_vars()
+        selected = [path for path, var in file_vars.items() if var.get()]
+        try:
+            count = PatchBundle.export(bundle_path, self.scan_index, selected)
+        except Exception as e:
+            messagebox.showerror("Error", f"Export patch failed: {e}")
+            return
+
+        size_kb = os.path.getsize(bundle_path) / 1024
+        messagebox.showinfo("Export Patch", f"{count} files exported ({size_kb:.1f} KB) to：{bundle_path}")
+
+    def apply_patch(self):
+        """Apply a patch bundle to the old folder, with backup and PDF report"""
+        old_folder = self.old_folder_path.get()
+        if not old_folder:
+            messagebox.showerror("Error", "Please select old folder.")
+            return
+
+        bundle_path = filedialog.askopenfilename(
+            filetypes=[("Replacer patch", "*.rpatch"), ("All files", "*.*")]
+        )
+        if not bundle_path:
+            return
+
+        # Check base hashes before touching anything
+        try:
+            problems = PatchBundle.verify(bundle_path, old_folder)
+        except (PatchError, OSError, zipfile.BadZipFile) as e:
+            messagebox.showerror("Error", f"Invalid patch: {e}")
+            return
+        if problems:
+            messagebox.showerror("Error", "Patch does not match old folder:\n" + "\n".join(problems[:20]))
+            return
+
+        if not self.backup_old_folder():
+            messagebox.showerror("Error", "Backup failed, stopping update process.")
+            return
+
+        try:
+            # Base hashes were checked above, apply only rebuilds and hash-checks the targets
+            applied, moves = PatchBundle.apply(bundle_path, old_folder, verified=True)
+        except Exception as e:
+            messagebox.showerror("Error", f"Apply patch failed: {e}\nBackup: {self.latest_backup_folder}")
+            return
+
+        message = f"Patch applied\nSuccess : {len(applied)} files\nMoved : {len(moves)} files"
+        messagebox.showinfo("Update result", message)
+
+        # The patched files are compared between the backup and the old folder
+        self.auto_generate_pdf(applied, old_folder, moves)
+
+        print("Patch applied.")
+
     def get_pdf_filename(self):
         """Generate a PDF filename based on the current timestamp and OP ID"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -383,8 +647,13 @@ class FileUpdateTool:
         return f"{timestamp}_{op_id}.pdf"
     
     
-    def auto_generate_pdf(self):
-        """Automatically generate a PDF report"""
+    def auto_generate_pdf(self, filenames=None, source_folder=None, moves=None, verify_failures=None):
+        """
+        Automatically generate a PDF report.
+        By default the selected files are compared between the backup and the new folder;
+        a patch apply passes the patched files, the patched folder and the moves of the bundle.
+        verify_failures lists (file, reason) pairs found by the post-update verification.
+        """
         if not self.latest_backup_folder:
             messagebox.showerror("Error", "Backup folder not found")
             return
@@ -399,37 +668,51 @@ class FileUpdateTool:
         pdf_filename = self.get_pdf_filename()
         pdf_path = os.path.join(pdf_dir, pdf_filename)
 
+        if filenames is None:
+            filenames = [path for path, var in self.file_tree.get_file_vars().items() if var.get()]
+        if source_folder is None:
+            source_folder = self.new_folder_path.get()
+        if moves is None:
+            moves = self.scan_index.moves if self.scan_index else {}
+
         # Generate PDF content
         updated_files = []
-        file_vars = self.file_tree.get_file_vars()
 
-        for filename, var in file_vars.items():
-            if var.get():
-                backup_file = os.path.join(self.latest_backup_folder, filename)
-                new_file = os.path.join(self.new_folder_path.get(), filename)
-
-                if os.path.exists(backup_file) and os.path.exists(new_file):
-                    try:
-                        with open(backup_file, 'r', encoding='utf-8') as f:
-                            backup_lines = f.readlines()
-                        with open(new_file, 'r', encoding='utf-8') as f:
-                            new_lines = f.readlines()
-                    except Exception:
-                        updated_files.append((filename, None))
-                        continue
-
-                    diff_lines = list(difflib.unified_diff(
-                        backup_lines, new_lines, fromfile='Old file', tofile='New file', lineterm=''
-                    ))
-
-                    if any(re.search(r'[\u4e00-\u9fff\uFFFD]', line) for line in diff_lines):
-                        updated_files.append((filename, None))
-                    elif diff_lines:
-                        updated_files.append((filename, diff_lines))
-
-        if updated_files:
+        for filename in filenames:
+            backup_file = os.path.join(self.latest_backup_folder, filename)
+            new_file = os.path.join(source_folder, filename)
+
+            # Moved files are compared against their old location in the backup
+            moved_from = moves.get(filename)
+            if moved_from and not os.path.exists(backup_file):
+                backup_file = os.path.join(self.latest_backup_folder, moved_from)
+
+            # Folders and other non-regular entries have no content to diff
+            if os.path.isfile(backup_file) and os.path.isfile(new_file):
+                try:
+                    # Decode both sides once with their detected encodings before diffing
+                    backup_lines, _ = FileEncodingDetector.read_lines(backup_file)
+                    new_lines, _ = FileEncodingDetector.read_lines(new_file)
+                except Exception:
+                    updated_files.append((filename, None))
+                    continue
+
+                if backup_lines is None or new_lines is None:
+                    updated_files.append((filename, None))
+                    continue
+
+                diff_lines = list(difflib.unified_diff(
+                    backup_lines, new_lines, fromfile='Old file', tofile='New file', lineterm=''
+                ))
+
+                if moved_from:
+                    updated_files.append((f"{filename} (moved from {moved_from})", diff_lines))
+                elif diff_lines:
+                    updated_files.append((filename, diff_lines))
+
+        if updated_files or verify_failures:
             op_text = self.op_entry.get().strip()
-            PDFReportGenerator.generate(pdf_path, op_text, updated_files)
+            PDFReportGenerator.generate(pdf_path, op_text, updated_files, verify_failures)
             messagebox.showinfo("PDF Export", f"PDF report has been saved to：{pdf_path}")
         else:
             messagebox.showinfo("PDF Export", "No files were updated")
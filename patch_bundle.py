@@ -0,0 +1,293 @@
+import difflib
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tempfile
+import zipfile
+from datetime import datetime
+
+from file_encoding import FileEncodingDetector
+from file_scanner import FolderScanner
+
+
+class PatchError(Exception):
+    """ Raised when a patch bundle cannot be read or does not match the target folder """
+
+
+class PatchBundle:
+    """ Export the changes between two folders as one compressed bundle and apply it offline """
+
+    FORMAT_VERSION = 1
+    MANIFEST_NAME = "manifest.json"
+    # Binary files are split at newlines and at most this many bytes per chunk
+    BINARY_CHUNK_SIZE = 4096
+    # Store the full file when the delta would not be clearly smaller
+    DELTA_MAX_RATIO = 0.9
+
+    @staticmethod
+    def hash_bytes(data):
+        """Return the SHA-256 hex digest of bytes"""
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def to_bundle_path(rel_path):
+        """Relative paths are stored with '/' so bundles work across platforms"""
+        return rel_path.replace(os.sep, '/')
+
+    @staticmethod
+    def from_bundle_path(bundle_path):
+        return bundle_path.replace('/', os.sep)
+
+    @staticmethod
+    def resolve_path(target_root, bundle_path):
+        """
+        Return the real path of a bundle path inside target_root.
+        Raise PatchError for absolute paths, '..' components or paths resolving outside target_root.
+        """
+        if not isinstance(bundle_path, str):
+            raise PatchError(f"Invalid path in patch bundle: {bundle_path!r}")
+        parts = bundle_path.replace('\\', '/').split('/')
+        if not bundle_path or bundle_path.startswith(('/', '\\')) or os.path.isabs(bundle_path) \
+                or os.path.splitdrive(bundle_path)[0] or '..' in parts:
+            raise PatchError(f"Unsafe path in patch bundle: {bundle_path}")
+
+        root = os.path.realpath(target_root)
+        path = os.path.realpath(os.path.join(root, PatchBundle.from_bundle_path(bundle_path)))
+        if os.path.commonpath([root, path]) != root or path == root:
+            raise PatchError(f"Path outside target folder in patch bundle: {bundle_path}")
+        return path
+
+    @staticmethod
+    def split_chunks(data, kind):
+        """Split bytes into the units the delta works on: lines for text, bounded chunks for binary"""
+        lines = data.splitlines(keepends=True)
+        if kind == 'lines':
+            return lines
+        size = PatchBundle.BINARY_CHUNK_SIZE
+        chunks = []
+        for line in lines:
+            if len(line) <= size:
+                chunks.append(line)
+            else:
+                chunks.extend(line[i:i + size] for i in range(0, len(line), size))
+        return chunks
+
+    @staticmethod
+    def make_delta(base, target, kind):
+        """Return (ops, inserted bytes) turning base into target, using diff opcodes over chunks"""
+        base_chunks = PatchBundle.split_chunks(base, kind)
+        target_chunks = PatchBundle.split_chunks(target, kind)
+        matcher = difflib.SequenceMatcher(None, base_chunks, target_chunks)
+
+        ops = []
+        inserted = []
+        inserted_size = 0
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                ops.append(['copy', i1, i2])
+            elif tag in ('replace', 'insert'):
+                data = b''.join(target_chunks[j1:j2])
+                ops.append(['insert', inserted_size, len(data)])
+                inserted.append(data)
+                inserted_size += len(data)
+        return ops, b''.join(inserted)
+
+    @staticmethod
+    def apply_delta(base, ops, inserted, kind):
+        """Rebuild the target bytes from the base bytes and a delta"""
+        base_chunks = PatchBundle.split_chunks(base, kind)
+        parts = []
+        for op in ops:
+            if op[0] == 'copy':
+                parts.extend(base_chunks[op[1]:op[2]])
+            elif op[0] == 'insert':
+                parts.append(inserted[op[1]:op[1] + op[2]])
+            else:
+                raise PatchError(f"Unknown delta operation: {op[0]}")
+        return b''.join(parts)
+
+    @staticmethod
+    def export(bundle_path, scan_index, rel_paths):
+        """
+        Write a bundle with the changes of rel_paths from scan_index.old_root to scan_index.new_root.
+        Identical files are skipped, moved files reference their old location.
+        Return the number of entries written.
+        """
+        entries = []
+        with zipfile.ZipFile(bundle_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=9) as bundle:
+            for rel_path in sorted(rel_paths):
+                entry = scan_index.get(rel_path)
+                if entry is None or entry.new_size is None or entry.status == 'identical':
+                    continue
+
+                with open(os.path.join(scan_index.new_root, rel_path), 'rb') as f:
+                    target = f.read()
+                item = {
+                    'path': PatchBundle.to_bundle_path(rel_path),
+                    'target_hash': PatchBundle.hash_bytes(target),
+                }
+
+                if entry.moved_from:
+                    item['op'] = 'move'
+                    base_rel = entry.moved_from
+                elif entry.status == 'modified':
+                    item['op'] = 'modify'
+                    base_rel = rel_path
+                else:
+                    item['op'] = 'add'
+                    base_rel = None
+
+                member = f"data/{len(entries)}.bin"
+                if base_rel is None:
+                    item['delta'] = 'full'
+                    bundle.writestr(member, target)
+                else:
+                    with open(os.path.join(scan_index.old_root, base_rel), 'rb') as f:
+                        base = f.read()
+                    item['base_path'] = PatchBundle.to_bundle_path(base_rel)
+                    # Hash the bytes the delta is built from, the scan-time hash may be stale
+                    item['base_hash'] = PatchBundle.hash_bytes(base)
+
+                    if base == target:
+                        item['delta'] = 'none'
+                    else:
+                        kind = 'lines' if FileEncodingDetector.sniff(target) else 'binary'
+                        ops, inserted = PatchBundle.make_delta(base, target, kind)
+                        delta_size = len(inserted) + len(json.dumps(ops))
+                        if delta_size < len(target) * PatchBundle.DELTA_MAX_RATIO:
+                            item['delta'] = kind
+                            item['ops'] = ops
+                            bundle.writestr(member, inserted)
+                        else:
+                            item['delta'] = 'full'
+                            bundle.writestr(member, target)
+
+                if item['delta'] != 'none':
+                    item['data'] = member
+                entries.append(item)
+
+            manifest = {
+                'format': PatchBundle.FORMAT_VERSION,
+                'created': datetime.now().strftime("%Y/%m/%d %H:%M:%S"),
+                'entries': entries,
+            }
+            bundle.writestr(PatchBundle.MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=1))
+        return len(entries)
+
+    @staticmethod
+    def read_manifest(bundle):
+        """Read and check the manifest of an open bundle"""
+        try:
+            manifest = json.loads(bundle.read(PatchBundle.MANIFEST_NAME).decode('utf-8'))
+        except (KeyError, ValueError) as e:
+            raise PatchError(f"Invalid patch bundle: {e}")
+        if manifest.get('format') != PatchBundle.FORMAT_VERSION:
+            raise PatchError(f"Unsupported patch format: {manifest.get('format')}")
+        return manifest
+
+    @staticmethod
+    def verify(bundle_path, target_root):
+        """
+        Return a list of problems found when checking the base hashes against target_root.
+        Raise PatchError if any path of the bundle would leave target_root.
+        """
+        problems = []
+        with zipfile.ZipFile(bundle_path) as bundle:
+            manifest = PatchBundle.read_manifest(bundle)
+
+        # Check every path before looking at any file
+        for item in manifest['entries']:
+            PatchBundle.resolve_path(target_root, item['path'])
+            if 'base_path' in item:
+                PatchBundle.resolve_path(target_root, item['base_path'])
+
+        for item in manifest['entries']:
+            if 'base_path' not in item:
+                continue
+            base_file = PatchBundle.resolve_path(target_root, item['base_path'])
+            if not os.path.isfile(base_file):
+                problems.append(f"{item['base_path']}: missing")
+                continue
+            if FolderScanner.hash_file(base_file) != item['base_hash']:
+                problems.append(f"{item['base_path']}: base content differs")
+        return problems
+
+    @staticmethod
+    def replace_file(src, dst):
+        """Move src over dst, creating folders and clearing a read-only flag on dst first"""
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        if os.path.exists(dst):
+            os.chmod(dst, stat.S_IWRITE | stat.S_IREAD)  # Read-only files cannot be replaced on Windows
+            os.remove(dst)
+        os.replace(src, dst)
+
+    @staticmethod
+    def apply(bundle_path, target_root, verified=False):
+        """
+        Apply a bundle to target_root. The base hashes are verified first unless the caller already did.
+        Every patched file is rebuilt and hash-checked in a staging folder before the target folder is
+        touched, so a bad entry leaves target_root unchanged.
+        Return (applied relative paths, {new relative path: old relative path} of moves).
+        """
+        if not verified:
+            problems = PatchBundle.verify(bundle_path, target_root)
+            if problems:
+                raise PatchError("Base files do not match:\n" + "\n".join(problems))
+
+        applied = []
+        moves = {}
+        staging = tempfile.mkdtemp(prefix=".patching-", dir=target_root)
+        try:
+            # Stage 1: rebuild every target from the unchanged base files
+            staged = []  # (item, destination, base file, staged target file or None)
+            with zipfile.ZipFile(bundle_path) as bundle:
+                manifest = PatchBundle.read_manifest(bundle)
+                for index, item in enumerate(manifest['entries']):
+                    dst = PatchBundle.resolve_path(target_root, item['path'])
+                    base_file = None
+                    if 'base_path' in item:
+                        base_file = PatchBundle.resolve_path(target_root, item['base_path'])
+
+                    if item['delta'] == 'none':
+                        target = None
+                    elif item['delta'] == 'full':
+                        target = bundle.read(item['data'])
+                    else:
+                        with open(base_file, 'rb') as f:
+                            base = f.read()
+                        target = PatchBundle.apply_delta(base, item['ops'], bundle.read(item['data']), item['delta'])
+
+                    staged_file = None
+                    if target is not None:
+                        if PatchBundle.hash_bytes(target) != item['target_hash']:
+                            raise PatchError(f"{item['path']}: patched content does not match the expected hash")
+                        staged_file = os.path.join(staging, f"{index}.bin")
+                        with open(staged_file, 'wb') as f:
+                            f.write(target)
+                    staged.append((item, dst, base_file, staged_file))
+
+            # Stage 2: take moved files out of the way first so chained or swapped moves keep their content
+            for index, (item, dst, base_file, staged_file) in enumerate(staged):
+                if item['op'] != 'move':
+                    continue
+                if staged_file is None:
+                    staged_file = os.path.join(staging, f"{index}.moved")
+                    os.replace(base_file, staged_file)
+                    staged[index] = (item, dst, base_file, staged_file)
+                else:
+                    os.chmod(base_file, stat.S_IWRITE | stat.S_IREAD)
+                    os.remove(base_file)
+
+            # Stage 3: put every staged file in place
+            for item, dst, base_file, staged_file in staged:
+                rel_path = PatchBundle.from_bundle_path(item['path'])
+                if staged_file is not None:
+                    PatchBundle.replace_file(staged_file, dst)
+                if item['op'] == 'move':
+                    moves[rel_path] = PatchBundle.from_bundle_path(item['base_path'])
+                applied.append(rel_path)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return applied, moves
@@ -1,15 +1,65 @@
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.colors import red, green, black
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfbase.cidfonts import UnicodeCIDFont
 from datetime import datetime
+import os
 import tkinter as tk
 from tkinter import messagebox
 
 class PDFReportGenerator:
     """ Responsible for generating a PDF update report """
-    
+
+    # TrueType fonts with CJK glyphs, (path, subfont index); reportlab embeds only the used glyphs
+    CJK_FONT_CANDIDATES = [
+        ("C:/Windows/Fonts/msjh.ttc", 0),        # Microsoft JhengHei
+        ("C:/Windows/Fonts/mingliu.ttc", 0),     # MingLiU
+        ("C:/Windows/Fonts/msyh.ttc", 0),        # Microsoft YaHei
+        ("C:/Windows/Fonts/simsun.ttc", 0),      # SimSun
+        ("/usr/share/fonts/truetype/wqy/wqy-microhei.ttc", 0),
+        ("/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc", 0),
+        ("/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf", 0),
+        ("/Library/Fonts/Arial Unicode.ttf", 0),
+    ]
+    CJK_FONT_NAME = "ReportCJK"
+    CID_FALLBACK_FONT = "MSung-Light"  # Non-embedded CID font, used when no TrueType font is found
+
+    _font_name = None
+
+    @staticmethod
+    def get_body_font():
+        """Register a CJK capable font once and return its name"""
+        if PDFReportGenerator._font_name:
+            return PDFReportGenerator._font_name
+
+        font_name = None
+        for font_path, subfont_index in PDFReportGenerator.CJK_FONT_CANDIDATES:
+            if not os.path.exists(font_path):
+                continue
+            try:
+                pdfmetrics.registerFont(TTFont(PDFReportGenerator.CJK_FONT_NAME, font_path,
+                                               subfontIndex=subfont_index))
+                font_name = PDFReportGenerator.CJK_FONT_NAME
+                break
+            except Exception as e:
+                print(f"Load font fail: {font_path}, {e}")
+
+        if font_name is None:
+            try:
+                pdfmetrics.registerFont(UnicodeCIDFont(PDFReportGenerator.CID_FALLBACK_FONT))
+                font_name = PDFReportGenerator.CID_FALLBACK_FONT
+            except Exception as e:
+                print(f"Load CID font fail: {e}")
+                font_name = "Helvetica"
+
+        PDFReportGenerator._font_name = font_name
+        return font_name
+
     @staticmethod
-    def generate(pdf_path, op_text, updated_files):
+    def generate(pdf_path, op_text, updated_files, verify_failures=None):
+        body_font = PDFReportGenerator.get_body_font()
         c = canvas.Canvas(pdf_path, pagesize=letter)
         width, height = letter
         y = height - 50
@@ -21,28 +71,51 @@ class PDFReportGenerator:
 
         # OP and Timestamp
         now_time = datetime.now().strftime("%Y/%m/%d %H:%M:%S")
-        c.setFont("Helvetica", 12)
+        c.setFont(body_font, 12)  # The OP ID may contain CJK characters
         c.drawString(50, y, f"OP: {op_text}")
         y -= 20
         c.drawString(50, y, f"Time: {now_time}")
         y -= 30
 
+        # Files whose written content does not match the source
+        if verify_failures is not None:
+            c.setFont(body_font, 12)
+            if verify_failures:
+                c.setFillColor(red)
+                c.drawString(50, y, f"Verification failed: {len(verify_failures)} files")
+                y -= 20
+                c.setFont(body_font, 10)
+                for filename, reason in verify_failures:
+                    if y < 50:
+                        c.showPage()
+                        c.setFont(body_font, 10)
+                        c.setFillColor(red)
+                        y = height - 50
+                    c.drawString(60, y, f"{filename}: {reason}")
+                    y -= 15
+            else:
+                c.drawString(50, y, "Verification: all written files match their source")
+            c.setFillColor(black)
+            y -= 30
+
         # List of updated files
         for filename, diff_lines in updated_files:
             if y < 50:
                 c.showPage()
                 y = height - 50
-            c.setFont("Helvetica-Bold", 12)
+            c.setFont(body_font, 12)
+            c.setFillColor(black)
             c.drawString(50, y, f"Filename: {filename}")
             y -= 20
-            c.setFont("Helvetica", 10)
+            c.setFont(body_font, 10)
             if diff_lines is None:
-                c.drawString(60, y, "Diff omitted.")
+                c.drawString(60, y, "Diff omitted (binary or undecodable file).")
                 y -= 15
             else:
                 for line in diff_lines:
                     if y < 50:
                         c.showPage()
+                        c.setFont(body_font, 10)  # A new page resets the font
                         y = height - 50
                     if line.startswith('-'):
                         c.setFillColor(red)
@@ -50,7 +123,7 @@ class PDFReportGenerator:
                         c.setFillColor(green)
                     else:
                         c.setFillColor(black)
-                    c.drawString(60, y, line.strip())
+                    c.drawString(60, y, line.strip().expandtabs(4))
                     y -= 15
             y -= 20
 